@@ -1,4 +1,10 @@
 from .ast_parser import Node, parse_edxml_to_ast
-from .ast_renderer_md import ast_to_html, ast_to_markdown
+from .ast_renderer_md import ast_to_html, ast_to_markdown, asts_to_markdown
 
-__all__ = ["Node", "parse_edxml_to_ast", "ast_to_html", "ast_to_markdown"]
+__all__ = [
+    "Node",
+    "parse_edxml_to_ast",
+    "ast_to_html",
+    "ast_to_markdown",
+    "asts_to_markdown",
+]
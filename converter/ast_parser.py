@@ -3,12 +3,14 @@ from dataclasses import dataclass, field
 from typing import Dict, List, Optional
 
 
-@dataclass
+@dataclass(slots=True)
 class Node:
     """
     Lightweight AST node representing the Ed XML structure.
     `kind` distinguishes text nodes from element nodes so that
     text order (including tails) is preserved.
+    Slots drop the per-instance __dict__, which matters when a large
+    document produces tens of thousands of nodes.
     """
 
     kind: str  # "element" or "text"
@@ -18,25 +20,39 @@ class Node:
     text: str = ""
 
 
-def _elem_to_node(elem: ET.Element) -> Node:
-    children: List[Node] = []
-
-    if elem.text:
-        children.append(Node(kind="text", text=elem.text))
-
-    for child in elem:
-        children.append(_elem_to_node(child))
-        if child.tail:
-            children.append(Node(kind="text", text=child.tail))
-
+def _make_node(elem: ET.Element) -> Node:
     return Node(
         kind="element",
         tag=elem.tag.lower(),
         attrs={k.lower(): v for k, v in elem.attrib.items()},
-        children=children,
     )
 
 
+def _elem_to_node(elem: ET.Element) -> Node:
+    """
+    Build the Node tree iteratively with an explicit stack, so deeply
+    nested documents neither pay per-level Python call overhead nor
+    risk RecursionError.
+    """
+    root = _make_node(elem)
+    stack: List[tuple] = [(elem, root)]
+
+    while stack:
+        e, node = stack.pop()
+
+        if e.text:
+            node.children.append(Node(kind="text", text=e.text))
+
+        for child in e:
+            child_node = _make_node(child)
+            node.children.append(child_node)
+            stack.append((child, child_node))
+            if child.tail:
+                node.children.append(Node(kind="text", text=child.tail))
+
+    return root
+
+
 def parse_edxml_to_ast(xml: str) -> Node:
     """
     Parse Ed XML into a normalized AST that preserves ordering.
@@ -1,6 +1,7 @@
-import html
-import json
+import functools
 import re
+import subprocess
+import threading
 from typing import Callable, Dict, List
 
 import pypandoc
@@ -8,8 +9,120 @@ import pypandoc
 from .ast_parser import Node
 
 
-# Global store for raw HTML blocks that must survive pandoc unchanged
-_RAW_BLOCKS: Dict[str, str] = {}
+# Store for raw HTML blocks that must survive pandoc unchanged. A
+# conversion runs entirely on one thread, but lessons convert
+# concurrently, so the store is thread-local: each worker gets its own
+# dict and the per-conversion reset/registration/substitution cycle
+# never sees another lesson's blocks.
+_RAW_STATE = threading.local()
+
+
+def _raw_blocks() -> Dict[str, str]:
+    blocks = getattr(_RAW_STATE, "blocks", None)
+    if blocks is None:
+        blocks = _RAW_STATE.blocks = {}
+    return blocks
+
+
+def _reset_raw_blocks() -> None:
+    _RAW_STATE.blocks = {}
+
+# Sentinel used to join many HTML fragments into one pandoc invocation;
+# it survives the HTML -> Markdown round trip as a plain paragraph.
+_BATCH_TOKEN = "CD985272F78311"
+
+# Precompiled patterns for the Markdown post-processing passes.
+# Compiling once at import time avoids re-parsing the same pattern
+# strings on every slide conversion.
+_RE_AUTOLINK = re.compile(r"(?<!\()<(https?://[^ >]+)>")
+# Negated classes instead of lazy dots: the engine can never backtrack
+# into the alt/src groups, so malformed input stays linear-time.
+_RE_IMG_MD = re.compile(r"!\[([^\]]*)\]\(([^)]*)\)(\{[^}]*\})?")
+_RE_ATTRS = re.compile(r'(\w+)="([^"]*)"')
+_RE_UNDERLINE_SPAN = re.compile(r"\[([^\]]+)\]\s*\{\.underline\}")
+# One fence-aware alternation replaces the old per-line cleanup loop:
+# fenced code blocks are matched whole and passed through untouched,
+# everything else is fixed up in the same single scan. [^\S\n] is
+# "horizontal whitespace" so rules never cross line boundaries.
+_RE_POST_CLEANUP = re.compile(
+    r"(?P<fence>^[^\S\n]*```[^\n]*(?:\n.*?)?\n[^\S\n]*```[^\n]*$)"
+    r"|(?P<comment>^[^\S\n]*<!-- -->[^\S\n]*\n?)"       # pandoc list gap
+    r"|^(?P<ol_indent>[^\S\n]*)(?P<ol_num>\d+)\.[^\S\n]+-[^\S\n]+"
+    r"|^(?P<ul_indent>[^\S\n]*)-[^\S\n]+-[^\S\n]+"
+    r"|\\(?=\*\*|__|\[|\])"                             # \** \__ \[ \]
+    r"|\\[^\S\n]*$",                                    # trailing forced break
+    re.MULTILINE | re.DOTALL,
+)
+
+
+def _post_cleanup_repl(m: re.Match) -> str:
+    if m.group("fence") is not None:
+        return m.group("fence")
+    if m.group("comment") is not None:
+        return ""
+    if m.group("ol_num") is not None:
+        return f"{m.group('ol_indent')}{m.group('ol_num')}. "
+    if m.group("ul_indent") is not None:
+        return m.group("ul_indent") + "- "
+    # stray backslashes (escaped emphasis / brackets / forced breaks)
+    return ""
+_RE_MD_LINK = re.compile(r"(?<!!)\[([^\]]+)\]\(([^)\s]+)\)")
+_RE_MULTI_WS = re.compile(r"\s{2,}")
+# srcdoc normalization: quote-escape and newline flattening fused into
+# one translate pass instead of two full str.replace scans
+_SRCDOC_TABLE = str.maketrans({"'": "&#39;", "\n": " "})
+# Matches any raw-block placeholder key produced by _register_raw_block
+_RE_RAW_PLACEHOLDER = re.compile(r"RAWBLOCK_\w+_\d+")
+
+# Ed only emits this small entity set inside snippet bodies; a short
+# alternation plus a translate table beat the stdlib's full entity
+# walk on long code blocks.
+_ENTITY_MAP = {
+    "lt": "<",
+    "gt": ">",
+    "amp": "&",
+    "quot": '"',
+    "apos": "'",
+    "#39": "'",
+    "#x27": "'",
+}
+_RE_ENTITY = re.compile(r"&(lt|gt|amp|quot|apos|#39|#x27);")
+# same characters html.escape(quote=True) covers
+_ESCAPE_TABLE = str.maketrans(
+    {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#x27;"}
+)
+
+
+def _unescape_entities(text: str) -> str:
+    # No & means no entities; the sniff spares the regex scan on the
+    # common all-plain code block
+    if "&" not in text:
+        return text
+    return _RE_ENTITY.sub(lambda m: _ENTITY_MAP[m.group(1)], text)
+
+# Resolved lazily so importing this module does not require pandoc
+_PANDOC_PATH: str | None = None
+
+
+def _pandoc_path() -> str:
+    global _PANDOC_PATH
+    if _PANDOC_PATH is None:
+        _PANDOC_PATH = pypandoc.get_pandoc_path()
+    return _PANDOC_PATH
+
+
+def _run_pandoc(text: str, source_format: str, to_format: str) -> str:
+    """
+    Invoke pandoc directly instead of via pypandoc.convert_text, which
+    spawns extra processes to list input/output formats on every call.
+    """
+    proc = subprocess.run(
+        [_pandoc_path(), "-f", source_format, "-t", to_format, "--wrap=none"],
+        input=text.encode("utf-8"),
+        capture_output=True,
+        check=True,
+    )
+    return proc.stdout.decode("utf-8")
 
 
 def _register_raw_block(html_snippet: str, kind: str) -> str:
@@ -18,9 +131,9 @@ def _register_raw_block(html_snippet: str, kind: str) -> str:
     This placeholder will go through pandoc as plain text, and we will
     replace it back to the HTML snippet in _post_process_markdown.
     """
-    global _RAW_BLOCKS
-    key = f"RAWBLOCK_{kind.upper()}_{len(_RAW_BLOCKS)}"
-    _RAW_BLOCKS[key] = html_snippet
+    blocks = _raw_blocks()
+    key = f"RAWBLOCK_{kind.upper()}_{len(blocks)}"
+    blocks[key] = html_snippet
     return key
 
 
@@ -28,7 +141,10 @@ def _render_children(
     children: List[Node],
     image_resolver: Callable[[str], str] | None,
 ) -> str:
-    return "".join(_render_node(child, image_resolver) for child in children)
+    out: List[str] = []
+    for child in children:
+        _emit(child, image_resolver, out)
+    return "".join(out)
 
 
 def _render_callout(
@@ -82,7 +198,7 @@ def _render_web_snippet(
             content = "".join(
                 c.text for c in child.children if c.kind == "text"
             ).strip()
-        content = html.unescape(content)
+        content = _unescape_entities(content)
 
         if lang == "html":
             html_code_parts.append(content)
@@ -112,8 +228,9 @@ def _render_web_snippet(
         html_block = f"\n\n{raw_html}\n\n"
     else:
         # Otherwise, wrap in an iframe srcdoc so the HTML/JS/CSS is sandboxed
-        srcdoc_content = raw_html.replace("'", "&#39;").replace("\n", " ")
-        srcdoc_content = re.sub(r"\s{2,}", " ", srcdoc_content).strip()
+        srcdoc_content = _RE_MULTI_WS.sub(
+            " ", raw_html.translate(_SRCDOC_TABLE)
+        ).strip()
         html_block = (
             "\n\n"
             f"<iframe srcdoc='{srcdoc_content}' "
@@ -125,171 +242,217 @@ def _render_web_snippet(
     return _register_raw_block(html_block, "websnippet")
 
 
-def _render_node(
+# Each emitter appends the HTML for one tag to the shared buffer.
+# Dispatch goes through the _EMITTERS dict below: O(1) per node instead
+# of walking an if/elif chain on the hottest path.
+
+
+def _emit_children(
     node: Node,
     image_resolver: Callable[[str], str] | None,
-) -> str:
-    if node.kind == "text":
-        # Plain text node: HTML-escape it
-        return html.escape(node.text)
-
-    tag = node.tag or ""
-
-    # Root document: just render children
-    if tag == "document":
-        return _render_children(node.children, image_resolver)
-
-    # Paragraphs
-    if tag == "paragraph":
-        return f"<p>{_render_children(node.children, image_resolver)}</p>"
-
-    # Headings
-    if tag == "heading":
-        level = node.attrs.get("level", "1")
-        try:
-            lvl_int = max(1, min(6, int(level)))
-        except ValueError:
-            lvl_int = 1
-        return f"<h{lvl_int}>{_render_children(node.children, image_resolver)}</h{lvl_int}>"
-
-    # Line break
-    if tag == "break":
-        return "<br />"
-
-    # Images
-    if tag == "image":
-        src = node.attrs.get("src") or ""
-        if not src:
-            return ""
-        width = node.attrs.get("width")
-        height = node.attrs.get("height")
-        processed_src = image_resolver(src) if image_resolver else src
-
-        attrs = [f'src="{processed_src}"', 'alt=""']
-        if width:
-            attrs.append(f'width="{width}"')
-        if height:
-            attrs.append(f'height="{height}"')
-        return "<img " + " ".join(attrs) + " />"
-
-    # Lists
-    if tag == "list":
-        style_val = (node.attrs.get("style") or "").lower()
-        list_tag = "ol" if style_val == "number" else "ul"
-        return f"<{list_tag}>{_render_children(node.children, image_resolver)}</{list_tag}>"
-
-    if tag == "list-item":
-        return f"<li>{_render_children(node.children, image_resolver)}</li>"
-
-    # Text styles
-    if tag == "bold":
-        return f"<strong>{_render_children(node.children, image_resolver)}</strong>"
-
-    if tag == "italic":
-        return f"<em>{_render_children(node.children, image_resolver)}</em>"
-
-    if tag == "underline":
-        return f"<u>{_render_children(node.children, image_resolver)}</u>"
-
-    # Blockquote (for quote-style blocks)
-    if tag in ("blockquote", "quote"):
-        return f"<blockquote>{_render_children(node.children, image_resolver)}</blockquote>"
-
-    # Inline code
-    if tag == "code":
-        return f"<code>{_render_children(node.children, image_resolver)}</code>"
-
-    # Preformatted block (non-snippet code blocks)
-    if tag == "pre":
-        inner = _render_children(node.children, image_resolver)
-        return f"<pre><code>{inner}</code></pre>"
-
-    if tag == "callout":
-        return _render_callout(node, image_resolver)
-
-    # Iframe (if present in raw XML)
-    if tag == "iframe":
-        # Rebuild <iframe ...> with attributes preserved
-        attrs_parts = [
-            f'{name}="{html.escape(value, quote=True)}"'
-            for name, value in (node.attrs or {}).items()
-        ]
-        attrs_str = (" " + " ".join(attrs_parts)) if attrs_parts else ""
-        html_block = (
-            "\n\n"
-            f"<iframe{attrs_str}>{_render_children(node.children, image_resolver)}</iframe>"
-            "\n\n"
-        )
-        # Register as raw block
-        return _register_raw_block(html_block, "iframe")
+    out: List[str],
+) -> None:
+    """Render children only; also the fallback for unknown wrappers."""
+    for child in node.children:
+        _emit(child, image_resolver, out)
 
-    # Links
-    if tag == "link":
-        href = node.attrs.get("href") or ""
-        safe_href = html.escape(href, quote=True)
-        return f'<a href="{safe_href}">{_render_children(node.children, image_resolver)}</a>'
 
-    # Ed "snippet" code blocks
-    if tag == "snippet":
-        lang = (node.attrs.get("language") or "").strip()
-        code_parts: List[str] = []
+def _make_wrap_emitter(open_tag: str, close_tag: str):
+    """Emitter for tags that are just open tag + children + close tag."""
+
+    def _emit_wrap(node, image_resolver, out):
+        out.append(open_tag)
         for child in node.children:
-            if child.kind == "element" and child.tag == "snippet-file":
-                code_parts.append(
-                    "".join(c.text for c in child.children if c.kind == "text")
-                )
-        code_raw = "\n".join(code_parts).strip("\n")
-        code_html = html.escape(html.unescape(code_raw))
-        class_attr = f' class="language-{lang}"' if lang else ""
-        return f"<pre><code{class_attr}>{code_html}</code></pre>"
-
-    # Web snippet (HTML/CSS/JS playground)
-    if tag == "web-snippet":
-        return _render_web_snippet(node, image_resolver)
+            _emit(child, image_resolver, out)
+        out.append(close_tag)
+
+    return _emit_wrap
+
+
+def _emit_heading(node, image_resolver, out):
+    level = node.attrs.get("level", "1")
+    try:
+        lvl_int = max(1, min(6, int(level)))
+    except ValueError:
+        lvl_int = 1
+    out.append(f"<h{lvl_int}>")
+    for child in node.children:
+        _emit(child, image_resolver, out)
+    out.append(f"</h{lvl_int}>")
+
+
+def _emit_break(node, image_resolver, out):
+    out.append("<br />")
+
+
+def _emit_image(node, image_resolver, out):
+    src = node.attrs.get("src") or ""
+    if not src:
+        return
+    width = node.attrs.get("width")
+    height = node.attrs.get("height")
+    processed_src = image_resolver(src) if image_resolver else src
+
+    attrs = [f'src="{processed_src}"', 'alt=""']
+    if width:
+        attrs.append(f'width="{width}"')
+    if height:
+        attrs.append(f'height="{height}"')
+    out.append("<img " + " ".join(attrs) + " />")
+
 
+def _emit_list(node, image_resolver, out):
+    style_val = (node.attrs.get("style") or "").lower()
+    list_tag = "ol" if style_val == "number" else "ul"
+    out.append(f"<{list_tag}>")
+    for child in node.children:
+        _emit(child, image_resolver, out)
+    out.append(f"</{list_tag}>")
+
+
+def _emit_callout(node, image_resolver, out):
+    out.append(_render_callout(node, image_resolver))
+
+
+def _emit_iframe(node, image_resolver, out):
+    # Rebuild <iframe ...> with attributes preserved; protected via a
+    # raw-block placeholder so pandoc does not rewrite it
+    attrs_parts = [
+        f'{name}="{value.translate(_ESCAPE_TABLE)}"'
+        for name, value in (node.attrs or {}).items()
+    ]
+    attrs_str = (" " + " ".join(attrs_parts)) if attrs_parts else ""
+    html_block = (
+        "\n\n"
+        f"<iframe{attrs_str}>{_render_children(node.children, image_resolver)}</iframe>"
+        "\n\n"
+    )
+    out.append(_register_raw_block(html_block, "iframe"))
+
+
+def _emit_link(node, image_resolver, out):
+    href = node.attrs.get("href") or ""
+    safe_href = href.translate(_ESCAPE_TABLE)
+    out.append(f'<a href="{safe_href}">')
+    for child in node.children:
+        _emit(child, image_resolver, out)
+    out.append("</a>")
+
+
+def _emit_snippet(node, image_resolver, out):
+    # Ed "snippet" code blocks
+    lang = (node.attrs.get("language") or "").strip()
+    code_parts: List[str] = []
+    for child in node.children:
+        if child.kind == "element" and child.tag == "snippet-file":
+            code_parts.append(
+                "".join(c.text for c in child.children if c.kind == "text")
+            )
+    code_raw = "\n".join(code_parts).strip("\n")
+    code_html = _unescape_entities(code_raw).translate(_ESCAPE_TABLE)
+    class_attr = f' class="language-{lang}"' if lang else ""
+    out.append(f"<pre><code{class_attr}>{code_html}</code></pre>")
+
+
+def _emit_web_snippet(node, image_resolver, out):
+    out.append(_render_web_snippet(node, image_resolver))
+
+
+def _emit_spoiler(node, image_resolver, out):
     # Spoiler -> <details><summary>Expand</summary>...</details>
     # Also protected via placeholder so pandoc does not rewrite it.
-    if tag == "spoiler":
-        inner = _render_children(node.children, image_resolver).strip()
-        html_block = (
-            "\n\n"
-            "<details><summary>Expand</summary>\n"
-            f"{inner}\n"
-            "</details>\n\n"
-        )
-        return _register_raw_block(html_block, "spoiler")
+    inner = _render_children(node.children, image_resolver).strip()
+    html_block = (
+        "\n\n"
+        "<details><summary>Expand</summary>\n"
+        f"{inner}\n"
+        "</details>\n\n"
+    )
+    out.append(_register_raw_block(html_block, "spoiler"))
+
+
+_EMITTERS: Dict[str, Callable] = {
+    "document": _emit_children,
+    "paragraph": _make_wrap_emitter("<p>", "</p>"),
+    "heading": _emit_heading,
+    "break": _emit_break,
+    "image": _emit_image,
+    "list": _emit_list,
+    "list-item": _make_wrap_emitter("<li>", "</li>"),
+    "bold": _make_wrap_emitter("<strong>", "</strong>"),
+    "italic": _make_wrap_emitter("<em>", "</em>"),
+    "underline": _make_wrap_emitter("<u>", "</u>"),
+    "blockquote": _make_wrap_emitter("<blockquote>", "</blockquote>"),
+    "quote": _make_wrap_emitter("<blockquote>", "</blockquote>"),
+    "code": _make_wrap_emitter("<code>", "</code>"),
+    "pre": _make_wrap_emitter("<pre><code>", "</code></pre>"),
+    "callout": _emit_callout,
+    "iframe": _emit_iframe,
+    "link": _emit_link,
+    "snippet": _emit_snippet,
+    "web-snippet": _emit_web_snippet,
+    "spoiler": _emit_spoiler,
+}
+
+
+def _emit(
+    node: Node,
+    image_resolver: Callable[[str], str] | None,
+    out: List[str],
+) -> None:
+    """
+    Append the HTML for `node` to `out`. A shared output buffer keeps
+    allocations linear in output size; the old per-node f-strings
+    rebuilt every enclosing string once per nesting level.
+    """
+    if node.kind == "text":
+        # Plain text node: HTML-escape it in one translate pass rather
+        # than html.escape's sequential str.replace chain
+        out.append(node.text.translate(_ESCAPE_TABLE))
+        return
 
-    # Default: just render children, dropping the wrapper tag
-    return _render_children(node.children, image_resolver)
+    # Unknown wrappers just render their children
+    _EMITTERS.get(node.tag or "", _emit_children)(node, image_resolver, out)
 
 
 def ast_to_html(
     node: Node,
     image_resolver: Callable[[str], str] | None = None,
 ) -> str:
-    return _render_node(node, image_resolver)
+    out: List[str] = []
+    _emit(node, image_resolver, out)
+    return "".join(out)
+
+
+# Only fragments this small are worth caching: the repeats are
+# boilerplate paragraphs and small figures, while big inputs (inlined
+# data: URIs, whole-lesson batch joins) essentially never recur and
+# would pin megabytes of HTML plus markdown per entry for the whole run
+_CACHE_MAX_HTML = 16 * 1024
+
+
+@functools.lru_cache(maxsize=2048)
+def _cached_html_to_markdown(html_text: str) -> str:
+    return _run_pandoc(html_text, "html", "markdown").strip()
 
 
 def _html_to_markdown_via_ast(html_text: str) -> str:
     """
-    Use pandoc's JSON AST as an intermediate so that HTML is normalized
-    before converting to Markdown.
+    Convert HTML to Markdown in one pandoc invocation. The old JSON-AST
+    intermediate round trip never mutated the AST, so going direct
+    halves the pandoc work per document. Small identical HTML fragments
+    (boilerplate paragraphs, repeated figures) skip pandoc entirely via
+    the cache; oversized inputs bypass it so the cache stays bounded in
+    bytes, not just entries. Raw-block placeholder keys repeat across
+    conversions (they restart from RAWBLOCK_*_0 each time), but the
+    markdown coming out of here still carries the placeholders verbatim
+    — a cache hit included — and substitution happens afterwards against
+    the current conversion's raw-block store, so stale protected content
+    can never leak through the cache.
     """
-    ast_json = pypandoc.convert_text(
-        html_text,
-        "json",
-        format="html",
-        extra_args=["--wrap=none"],
-    )
-    ast = json.loads(ast_json)
-
-    md = pypandoc.convert_text(
-        json.dumps(ast),
-        "md",
-        format="json",
-        extra_args=["--wrap=none"],
-    )
-    return md.strip()
+    if len(html_text) <= _CACHE_MAX_HTML:
+        return _cached_html_to_markdown(html_text)
+    return _run_pandoc(html_text, "html", "markdown").strip()
 
 
 def _post_process_markdown(md: str) -> str:
@@ -303,20 +466,16 @@ def _post_process_markdown(md: str) -> str:
       - Remove angle brackets around bare autolinks (<url> -> url)
       - Restore raw HTML blocks (spoilers / iframes / web-snippets)
     """
-    global _RAW_BLOCKS
-
     md = md or ""
     if not md.strip():
-        # Also clear raw blocks to avoid leaking across calls
-        _RAW_BLOCKS = {}
         return md.strip()
 
+    # Each pass below is gated on a cheap substring sniff: clean
+    # Markdown (the common case) then skips the regex scans entirely.
+
     # Fix pandoc autolinks: <url> -> url (but keep link targets like [text](url))
-    md = re.sub(
-        r"(?<!\()<(https?://[^ >]+)>",
-        r"\1",
-        md,
-    )
+    if "<http" in md:
+        md = _RE_AUTOLINK.sub(r"\1", md)
 
     # Markdown image syntax with {width=".."} etc. -> <img ...>
     def _img_md_to_html(match: re.Match) -> str:
@@ -324,77 +483,38 @@ def _post_process_markdown(md: str) -> str:
         src = match.group(2) or ""
         attrs = match.group(3) or ""
 
-        width_match = re.search(r'width="([^"]+)"', attrs or "")
-        height_match = re.search(r'height="([^"]+)"', attrs or "")
+        # one scan over the attribute blob instead of one search per attr
+        attrs_dict = dict(_RE_ATTRS.findall(attrs or ""))
+        width = attrs_dict.get("width")
+        height = attrs_dict.get("height")
 
-        w_attr = f' width="{width_match.group(1)}"' if width_match else ""
-        h_attr = f' height="{height_match.group(1)}"' if height_match else ""
+        w_attr = f' width="{width}"' if width else ""
+        h_attr = f' height="{height}"' if height else ""
 
         # always emit a plain <img> tag
         return f'<img src="{src}" alt="{alt}"{w_attr}{h_attr}>'
 
-    md = re.sub(
-        r'!\[(.*?)\]\((.*?)\)(\{[^}]*\})?',
-        _img_md_to_html,
-        md,
-        flags=re.DOTALL,
-    )
+    if "![" in md:
+        md = _RE_IMG_MD.sub(_img_md_to_html, md)
 
     # pandoc underline span: [text]{.underline} -> <u>text</u>
-    md = re.sub(
-        r"\[([^\]]+)\]\s*\{\.underline\}",
-        r"<u>\1</u>",
-        md,
-    )
-
-    # Line-by-line cleanup ---
-    cleaned_lines: List[str] = []
-    in_code_block = False
-
-    for line in md.splitlines():
-        stripped = line.strip()
+    if "{.underline}" in md:
+        md = _RE_UNDERLINE_SPAN.sub(r"<u>\1</u>", md)
 
-        # Code block fence: do not touch content inside fenced code blocks
-        if stripped.startswith("```"):
-            cleaned_lines.append(line.rstrip("\n"))
-            in_code_block = not in_code_block
-            continue
-
-        if in_code_block:
-            cleaned_lines.append(line.rstrip("\n"))
-            continue
-
-        # Remove empty HTML comment placeholders
-        if stripped == "<!-- -->":
-            continue
-
-        # Fix pandoc list oddities: "1. - Item" and "- - Item"
-        line = re.sub(r"^(\s*)(\d+)\.\s+-\s+", r"\1\2. ", line)
-        line = re.sub(r"^(\s*)-\s+-\s+", r"\1- ", line)
-
-        # Remove extra backslashes before bold/italic markers
-        # e.g. \**bold** -> **bold**, \__italic__ -> __italic__
-        line = re.sub(r"(\\)(?=\*\*|__)", "", line)
-
-        # Remove trailing backslashes used for forced line breaks
-        if line.rstrip().endswith("\\"):
-            line = re.sub(r"\\\s*$", "", line)
-
-        # math trigger
-        # Here we only remove the backslash and keep the brackets unchanged
-        line = re.sub(r"\\(?=\[)", "", line)
-        line = re.sub(r"\\(?=\])", "", line)
-
-        cleaned_lines.append(line.rstrip("\n"))
-
-    md = "\n".join(cleaned_lines).strip()
+    # Whole-document cleanup: fix pandoc list oddities ("1. - Item",
+    # "- - Item"), drop empty comment placeholders and stray
+    # backslashes, all in one fence-aware multiline pass.
+    if "\\" in md or "<!-- -->" in md or "- " in md:
+        md = _RE_POST_CLEANUP.sub(_post_cleanup_repl, md)
+    md = md.strip()
 
     # Restore raw HTML blocks (spoiler / iframe / web-snippet, etc.)
-    for placeholder, html_snippet in _RAW_BLOCKS.items():
-        md = md.replace(placeholder, html_snippet)
-
-    # Clear for next call
-    _RAW_BLOCKS = {}
+    # in one scan instead of one full-string replace per block
+    blocks = _raw_blocks()
+    if blocks:
+        md = _RE_RAW_PLACEHOLDER.sub(
+            lambda m: blocks.get(m.group(0), m.group(0)), md
+        )
 
     # fix links with label: [label](url) -> <a href="url">label</a>
     def _links_with_html_to_html(text: str) -> str:
@@ -403,7 +523,6 @@ def _post_process_markdown(md: str) -> str:
         Normal [text](url) is preserved as-is.
         Images ![alt](src) are excluded here.
         """
-        pattern = r'(?<!!)\[([^\]]+)\]\(([^)\s]+)\)'
 
         def repl(m: re.Match) -> str:
             label = m.group(1)
@@ -413,28 +532,221 @@ def _post_process_markdown(md: str) -> str:
             if "<" not in label and ">" not in label:
                 return m.group(0)
 
-            safe_url = html.escape(url, quote=True)
+            safe_url = url.translate(_ESCAPE_TABLE)
             # html tags involved
             return f'<a href="{safe_url}">{label}</a>'
 
-        return re.sub(pattern, repl, text)
+        return _RE_MD_LINK.sub(repl, text)
 
-    md = _links_with_html_to_html(md)
+    if "](" in md:
+        md = _links_with_html_to_html(md)
 
     return md
 
 
+# Tags the built-in fast path can render without pandoc. Anything
+# else (images, snippets, callouts, tables, ...) falls back to the
+# full pandoc round trip.
+_SIMPLE_TAGS = {
+    "document",
+    "paragraph",
+    "heading",
+    "break",
+    "bold",
+    "italic",
+    "code",
+    "link",
+    "list",
+    "list-item",
+}
+
+
+def _is_simple_ast(node: Node) -> bool:
+    if node.kind == "text":
+        return True
+    if node.tag not in _SIMPLE_TAGS:
+        return False
+    return all(_is_simple_ast(child) for child in node.children)
+
+
+# Inline metacharacters that would change meaning if emitted verbatim
+# (emphasis, code spans, links, raw HTML); escaped the way pandoc
+# escapes literal text.
+_MD_ESCAPE_TABLE = str.maketrans({c: "\\" + c for c in "\\`*_[]<>"})
+
+# Markers that start a heading / list item / blockquote when they lead
+# a line ("# not a heading", "- not a list", "1. not a list")
+_RE_MD_BLOCK_START = re.compile(r"^(?:[#>+-]|\d+[.)])(?=\s|$)", re.MULTILINE)
+
+
+def _block_start_repl(m: re.Match) -> str:
+    tok = m.group(0)
+    # "1." escapes as "1\." — a backslash before the digit would not parse
+    if tok[0].isdigit():
+        return tok[:-1] + "\\" + tok[-1]
+    return "\\" + tok
+
+
+def _escape_block_starts(text: str) -> str:
+    return _RE_MD_BLOCK_START.sub(_block_start_repl, text)
+
+
+def _plain_text(children: List[Node]) -> str:
+    """Unescaped text of a subtree, for inline code spans."""
+    parts: List[str] = []
+    for child in children:
+        if child.kind == "text":
+            parts.append(child.text)
+        else:
+            parts.append(_plain_text(child.children))
+    return "".join(parts)
+
+
+def _simple_inline(children: List[Node], break_repl: str = "\n") -> str:
+    parts: List[str] = []
+    for child in children:
+        if child.kind == "text":
+            parts.append(child.text.translate(_MD_ESCAPE_TABLE))
+        elif child.tag == "bold":
+            parts.append(f"**{_simple_inline(child.children, break_repl)}**")
+        elif child.tag == "italic":
+            parts.append(f"*{_simple_inline(child.children, break_repl)}*")
+        elif child.tag == "code":
+            # code spans carry their text literally; widen the fence if
+            # the code itself contains a backtick
+            code = _plain_text(child.children)
+            parts.append(f"`` {code} ``" if "`" in code else f"`{code}`")
+        elif child.tag == "link":
+            href = child.attrs.get("href") or ""
+            parts.append(f"[{_simple_inline(child.children, break_repl)}]({href})")
+        elif child.tag == "break":
+            parts.append(break_repl)
+        else:
+            parts.append(_simple_inline(child.children, break_repl))
+    return "".join(parts)
+
+
+def _simple_list(node: Node, depth: int) -> str:
+    ordered = (node.attrs.get("style") or "").lower() == "number"
+    indent = "    " * depth
+    lines: List[str] = []
+    number = 0
+    for child in node.children:
+        if child.kind != "element" or child.tag != "list-item":
+            continue
+        number += 1
+        marker = f"{number}." if ordered else "-"
+        inline_parts: List[str] = []
+        nested: List[str] = []
+        for sub in child.children:
+            if sub.kind == "element" and sub.tag == "list":
+                nested.append(_simple_list(sub, depth + 1))
+            else:
+                inline_parts.append(_simple_inline([sub]))
+        text = _escape_block_starts("".join(inline_parts).strip())
+        lines.append(f"{indent}{marker} {text}")
+        lines.extend(nested)
+    return "\n".join(lines)
+
+
+def _render_simple_md(node: Node) -> str:
+    """
+    Render a pandoc-free Markdown conversion of a simple AST
+    (plain paragraphs, headings, emphasis, lists and links).
+    """
+    blocks: List[str] = []
+    for child in node.children:
+        if child.kind == "text":
+            text = _escape_block_starts(child.text.translate(_MD_ESCAPE_TABLE).strip())
+            if text:
+                blocks.append(text)
+        elif child.tag == "paragraph":
+            text = _escape_block_starts(_simple_inline(child.children).strip())
+            if text:
+                blocks.append(text)
+        elif child.tag == "heading":
+            try:
+                level = max(1, min(6, int(child.attrs.get("level", "1"))))
+            except ValueError:
+                level = 1
+            # A break inside a heading must not split the line, or the
+            # tail would fall out of the heading; collapse it to a space
+            text = _simple_inline(child.children, break_repl=" ").strip()
+            blocks.append("#" * level + " " + text)
+        elif child.tag == "list":
+            blocks.append(_simple_list(child, 0))
+        elif child.tag == "break":
+            continue
+        else:
+            text = _escape_block_starts(_simple_inline(child.children).strip())
+            if text:
+                blocks.append(text)
+    return "\n\n".join(blocks).strip()
+
+
 def ast_to_markdown(
     node: Node,
     image_resolver: Callable[[str], str] | None = None,
 ) -> str:
-    # Reset raw block store at the start of each top-level conversion
-    global _RAW_BLOCKS
-    _RAW_BLOCKS = {}
+    # Plain slides never need pandoc; render them directly
+    if _is_simple_ast(node):
+        return _render_simple_md(node)
+
+    # Reset this thread's raw block store at the start of each
+    # top-level conversion
+    _reset_raw_blocks()
 
     html_text = ast_to_html(node, image_resolver=image_resolver)
     if not html_text.strip():
         return ""
     md = _html_to_markdown_via_ast(html_text)
     md = _post_process_markdown(md)
+    _reset_raw_blocks()
     return md
+
+
+def asts_to_markdown(
+    nodes: List[Node],
+    image_resolver: Callable[[str], str] | None = None,
+) -> List[str]:
+    """
+    Convert many ASTs with a single pandoc invocation.
+    Fragments are joined with a sentinel paragraph, converted once,
+    and split back, so a lesson pays one process spawn instead of
+    one per slide. Results keep the input order.
+    """
+    _reset_raw_blocks()
+
+    results = [""] * len(nodes)
+
+    # Simple slides skip pandoc entirely; only the rest join the batch
+    complex_nodes: List[tuple] = []
+    for i, node in enumerate(nodes):
+        if _is_simple_ast(node):
+            results[i] = _render_simple_md(node)
+        else:
+            complex_nodes.append((i, node))
+
+    htmls = [
+        (i, ast_to_html(node, image_resolver=image_resolver))
+        for i, node in complex_nodes
+    ]
+
+    non_empty = [(i, h) for i, h in htmls if h.strip()]
+    if not non_empty:
+        return results
+
+    joined = f"\n\n<p>{_BATCH_TOKEN}</p>\n\n".join(h for _, h in non_empty)
+    md = _html_to_markdown_via_ast(joined)
+    pieces = md.split(_BATCH_TOKEN)
+
+    if len(pieces) != len(non_empty):
+        # Sentinel got mangled (should not happen) - fall back to
+        # converting fragments one by one.
+        pieces = [_html_to_markdown_via_ast(h) for _, h in non_empty]
+
+    for (i, _), piece in zip(non_empty, pieces):
+        results[i] = _post_process_markdown(piece.strip())
+
+    _reset_raw_blocks()
+    return results
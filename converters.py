@@ -1,26 +1,86 @@
+import functools
 import re
 
 from converter.ast_parser import parse_edxml_to_ast
-from converter.ast_renderer_md import ast_to_markdown
+from converter.ast_renderer_md import ast_to_markdown, asts_to_markdown
+
+# Lookahead keeps the heading text out of the match, so the sub only
+# rewrites the marker instead of copying every heading line
+_RE_HEADING = re.compile(r"^(#{1,6})(?=[ \t])", re.MULTILINE)
+
+# hashes -> shifted hashes, built once per offset so the sub callback
+# is a dict lookup instead of recomputing the level per match
+_SHIFT_TABLES: dict[int, dict[str, str]] = {}
+
+# Boilerplate fragments that render to nothing; quiz passages are very
+# often one of these, so skipping the parse/render avoids the bulk of
+# conversions in quiz-heavy lessons
+_TRIVIAL_XML = frozenset({
+    "<document></document>",
+    "<document/>",
+    "<paragraph></paragraph>",
+    "<paragraph/>",
+})
+
+
+def _shift_table(offset: int) -> dict[str, str]:
+    table = _SHIFT_TABLES.get(offset)
+    if table is None:
+        table = {
+            "#" * level: "#" * min(level + offset, 6)
+            for level in range(1, 7)
+        }
+        _SHIFT_TABLES[offset] = table
+    return table
 
 
 def shift_markdown_headings(md: str, offset: int = 1) -> str:
     """
     Shift all Markdown heading levels down by `offset` levels.
     """
+    table = _shift_table(offset)
+    return _RE_HEADING.sub(lambda m: table[m.group(1)], md)
 
-    def _repl(match: re.Match) -> str:
-        hashes = match.group(1)
-        text = match.group(2)
-        new_level = min(len(hashes) + offset, 6)
-        return "#" * new_level + " " + text
 
-    return re.sub(r"^(#{1,6})\s+(.*)$", _repl, md, flags=re.MULTILINE)
+@functools.lru_cache(maxsize=4096)
+def _edxml_to_markdown_cached(xml: str) -> str:
+    node = parse_edxml_to_ast(xml)
+    return ast_to_markdown(node)
 
 
 def edxml_to_markdown(xml: str, image_resolver=None) -> str:
     """
     Convert raw EdXML to Markdown via the shared AST pipeline.
+    Resolver-less conversions are memoized: small fragments (empty
+    passages, boilerplate wrappers) repeat a lot across quiz
+    questions and slides. Calls with an image resolver skip the
+    cache because resolving has side effects (downloads, files).
     """
+    xml_stripped = xml.strip() if xml else ""
+    if not xml_stripped or xml_stripped in _TRIVIAL_XML:
+        return ""
+    if image_resolver is None:
+        return _edxml_to_markdown_cached(xml)
     node = parse_edxml_to_ast(xml)
     return ast_to_markdown(node, image_resolver=image_resolver)
+
+
+def edxml_batch_to_markdown(xmls: list[str], image_resolver=None) -> list[str]:
+    """
+    Convert many EdXML fragments in one pandoc invocation.
+    Results keep the input order; trivial fragments skip parsing.
+    """
+    results: list[str | None] = []
+    nodes = []
+    for xml in xmls:
+        xml_stripped = xml.strip() if xml else ""
+        if not xml_stripped or xml_stripped in _TRIVIAL_XML:
+            results.append("")
+        else:
+            results.append(None)
+            nodes.append(parse_edxml_to_ast(xml))
+
+    if nodes:
+        mds = iter(asts_to_markdown(nodes, image_resolver=image_resolver))
+        results = [md if md is not None else next(mds) for md in results]
+    return results
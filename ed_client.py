@@ -1,8 +1,16 @@
 import base64
+import functools
+import hashlib
+import json
+import logging
 import mimetypes
 import os
+import random
 import re
+import threading
 import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any, Callable, Dict, List, Tuple
 from urllib.parse import quote, unquote, urlparse
@@ -10,10 +18,63 @@ from urllib.parse import quote, unquote, urlparse
 import filetype
 import requests
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Diagnostics go through one shared logger (configured in main) so a
+# course with hundreds of lessons does one buffered stderr write per
+# message instead of a line-buffered stdout flush per print.
+log = logging.getLogger("edstem")
+
+
+def _loads(data: bytes) -> Any:
+    """
+    Decode a JSON response body from bytes.
+    Uses orjson when installed (faster, skips requests' text decoding),
+    stdlib json otherwise.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
 class EdApiError(Exception):
     pass
 
 
+# Shared session so every Ed API call and image download reuses
+# one keep-alive TLS connection instead of re-handshaking each time.
+_SESSION = requests.Session()
+_ADAPTER = requests.adapters.HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=0,
+)
+_SESSION.mount("https://", _ADAPTER)
+_SESSION.mount("http://", _ADAPTER)
+
+
+# Cap on any single retry delay, in seconds
+_MAX_BACKOFF = 10.0
+
+
+def _retry_delay(attempt: int, backoff: float, retry_after: str | None = None) -> float:
+    """
+    Compute how long to sleep before the next retry.
+    Honors the server's Retry-After header when present, otherwise
+    full-jitter exponential backoff so concurrent workers don't all
+    retry at the same instant.
+    """
+    if retry_after:
+        try:
+            return min(float(retry_after), _MAX_BACKOFF)
+        except ValueError:
+            pass
+    return random.uniform(0, min(_MAX_BACKOFF, backoff * (2 ** (attempt - 1))))
+
+
 def request(
     method: str,
     url: str,
@@ -27,41 +88,54 @@ def request(
 
     for attempt in range(1, retries + 1):
         status = ""
-        body_repr = ""
+        resp = None
 
         try:
-            resp = requests.request(method, url, **kwargs)
+            resp = _SESSION.request(method, url, **kwargs)
             status = str(resp.status_code)
 
-            try:
-                body_repr = repr(resp.text)
-            except Exception:
-                body_repr = "<non-text response>"
-
-            if 200 <= resp.status_code <= 299:
+            # 304 is a valid answer to conditional GETs from the cache
+            if 200 <= resp.status_code <= 299 or resp.status_code == 304:
                 return resp
 
             if resp.status_code == 429 or 500 <= resp.status_code <= 599:
                 if attempt < retries:
-                    print(
-                        f"Request got bad status {resp.status_code}, "
-                        f"retrying ({attempt}/{retries})..."
+                    log.warning(
+                        "Request got bad status %s, retrying (%d/%d)...",
+                        resp.status_code,
+                        attempt,
+                        retries,
+                    )
+                    time.sleep(
+                        _retry_delay(
+                            attempt, backoff, resp.headers.get("Retry-After")
+                        )
                     )
-                    time.sleep(backoff * attempt)
                     continue
 
             raise EdApiError(f"Bad status code: {resp.status_code}")
 
         except Exception as e:
             last_exception = e
-            print("Request failed")
-            print(f"Status: {status}")
-            print(f"URL: {url}")
-            print(f"Body: {body_repr}")
+            # Only decode the body on the failure path; on 2xx success
+            # (the common case) this would force a full-text decode of
+            # potentially multi-megabyte lesson payloads.
+            body_repr = ""
+            if resp is not None:
+                try:
+                    body_repr = repr(resp.text[:512])
+                except Exception:
+                    body_repr = "<non-text response>"
+            log.warning(
+                "Request failed\nStatus: %s\nURL: %s\nBody: %s",
+                status,
+                url,
+                body_repr,
+            )
 
             if attempt < retries:
-                print(f"Retrying ({attempt}/{retries})...")
-                time.sleep(backoff * attempt)
+                log.warning("Retrying (%d/%d)...", attempt, retries)
+                time.sleep(_retry_delay(attempt, backoff))
                 continue
             else:
                 raise
@@ -71,6 +145,90 @@ def request(
     raise RuntimeError("Unexpected request() failure")
 
 
+# On-disk cache for Ed API GET bodies so re-runs skip unchanged
+# fetches. Entries younger than the TTL are served without touching
+# the network; older ones are revalidated with If-None-Match when an
+# ETag was stored.
+_CACHE_DIR = Path(".ed_cache")
+_CACHE_TTL = 86400.0  # seconds
+
+# Downloaded image assets live next to the response cache so repeat
+# runs of the same course skip the image traffic entirely.
+_IMAGE_CACHE_DIR = _CACHE_DIR / "images"
+
+# Images above this size are skipped rather than inlined; a pathological
+# asset would otherwise balloon both memory and the markdown output.
+_MAX_IMAGE_BYTES = 25 * 1024 * 1024
+
+# Budget for image bytes held in process memory. The oldest entries
+# are dropped first; evicted assets reload cheaply from the disk cache,
+# so this just keeps RSS bounded on media-heavy courses.
+_IMAGE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+def cached_get(url: str, *, headers: Dict[str, str] | None = None,
+               ttl: float = _CACHE_TTL) -> bytes:
+    """
+    GET `url` through the retrying request() wrapper with a local
+    response cache keyed by sha1(url). Returns the response body.
+    """
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    body_path = _CACHE_DIR / f"{key}.body"
+    meta_path = _CACHE_DIR / f"{key}.meta"
+
+    meta = None
+    if body_path.is_file() and meta_path.is_file():
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except Exception:
+            meta = None
+
+    if meta and time.time() - meta.get("fetched_at", 0.0) < ttl:
+        return body_path.read_bytes()
+
+    req_headers = dict(headers or {})
+    etag = meta.get("etag") if meta else None
+    if etag and body_path.is_file():
+        req_headers["If-None-Match"] = etag
+
+    resp = request("GET", url, headers=req_headers)
+
+    if resp.status_code == 304 and body_path.is_file():
+        meta = meta or {}
+        meta["fetched_at"] = time.time()
+        _write_cache_entry(meta_path, body_path, meta, None)
+        return body_path.read_bytes()
+
+    body = resp.content
+    meta = {
+        "url": url,
+        "etag": resp.headers.get("ETag"),
+        "fetched_at": time.time(),
+    }
+    _write_cache_entry(meta_path, body_path, meta, body)
+    return body
+
+
+def _write_cache_entry(
+    meta_path: Path,
+    body_path: Path,
+    meta: dict,
+    body: bytes | None,
+) -> None:
+    """Persist a cache entry atomically; failures just mean no cache."""
+    try:
+        body_path.parent.mkdir(parents=True, exist_ok=True)
+        if body is not None:
+            tmp = body_path.with_suffix(".body.tmp")
+            tmp.write_bytes(body)
+            os.replace(tmp, body_path)
+        tmp = meta_path.with_suffix(".meta.tmp")
+        tmp.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp, meta_path)
+    except OSError as e:
+        log.warning("Response cache write failed: %s", e)
+
+
 def choice_validate(options: List[str], message: str) -> int:
     """
     Prompt the user choose a number from `options`, 
@@ -85,17 +243,87 @@ def choice_validate(options: List[str], message: str) -> int:
             print("Invalid input. Try again.")
 
 
+# 57 KiB is a multiple of 3, so chunk boundaries never introduce
+# base64 padding mid-stream
+_B64_CHUNK = 57 * 1024
+
+
+def _data_uri(mime: str, content: bytes) -> str:
+    """
+    Build a data: URI, base64-encoding in chunks over a memoryview.
+    The prefix joins the encoded chunks at the bytes level and the
+    result decodes once, so the largest transient allocation is one
+    chunk instead of a second full copy of the image.
+    """
+    prefix = f"data:{mime};base64,".encode("ascii")
+    if len(content) <= _B64_CHUNK:
+        return (prefix + base64.b64encode(content)).decode("ascii")
+    view = memoryview(content)
+    parts = [prefix]
+    parts.extend(
+        base64.b64encode(view[i:i + _B64_CHUNK])
+        for i in range(0, len(content), _B64_CHUNK)
+    )
+    return b"".join(parts).decode("ascii")
+
+
+# Parse the system mime tables once at import instead of lazily on the
+# first guess inside the per-image hot path
+mimetypes.init()
+
+# The handful of types Ed actually serves, resolved without scanning
+# mimetypes' internal tables; anything else falls back to the stdlib
+_MIME2EXT = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+    "image/svg+xml": ".svg",
+    "image/bmp": ".bmp",
+    "image/tiff": ".tiff",
+    "application/pdf": ".pdf",
+}
+
+
+@functools.lru_cache(maxsize=256)
+def _guess_mime(url: str) -> str | None:
+    """Cached mimetypes.guess_type; assets repeat across slides."""
+    return mimetypes.guess_type(url)[0]
+
+
+@functools.lru_cache(maxsize=256)
+def _guess_filetype(head: bytes):
+    """
+    Cached filetype.guess keyed on the magic-byte prefix (filetype only
+    inspects the first ~261 bytes), so repeated assets sniff once.
+    Only reached when neither the response header nor the URL yields a
+    mime type.
+    """
+    return filetype.guess(head)
+
+
+# Fixed bad-character set: one C-level translate pass beats a regex sub
+_BAD_CHARS_TABLE = str.maketrans({c: "_" for c in '\\/:*?"<>|'})
+_RE_WHITESPACE = re.compile(r"\s+")
+
+# Trailing file extension of a URL path (query/fragment stripped first)
+_RE_URL_EXT = re.compile(r"\.([A-Za-z0-9]{2,5})$")
+
+# Content-Disposition filename extraction (RFC 5987 form, then plain)
+_RE_FILENAME_EXT = re.compile(r'filename\\*=UTF-8\\\'\\\'([^;]+)')
+_RE_FILENAME_PLAIN = re.compile(r'filename="?([^";]+)"?')
+
+
 def safe_filename(name: str) -> str:
     """
-    Convert course / module / lesson name into safe name 
+    Convert course / module / lesson name into safe name
     without special chars for OS display.
     """
     if not name:
         return "unnamed"
 
-    name = name.strip()
-    name = re.sub(r'[\\/:*?"<>|]', "_", name)
-    name = re.sub(r"\s+", " ", name)
+    name = name.strip().translate(_BAD_CHARS_TABLE)
+    name = _RE_WHITESPACE.sub(" ", name)
     return name
 
 
@@ -112,32 +340,189 @@ class EdClient:
         # cache downloaded assets to avoid duplicates
         # value: (content, mime from response header or None, filename from header or None)
         self._image_cache: Dict[str, Tuple[bytes, str | None, str | None]] = {}
+        self._image_cache_bytes = 0
+        # insert/evict must be atomic: prefetch pools in several lesson
+        # workers hit the cache at once, and racing evictions can pop
+        # the same key or iterate a dict mid-resize
+        self._image_cache_lock = threading.Lock()
+        # url -> finished data: URI, so the same asset referenced from
+        # several lessons is base64-encoded exactly once per run
+        self._data_uri_cache: Dict[str, str] = {}
+        # filenames already claimed per assets dir; lesson workers share
+        # a module's assets dir, so claims must go through one locked
+        # registry or two resolvers can both pick e.g. img001.png and
+        # silently overwrite each other
+        self._asset_names: Dict[Path, set[str]] = {}
+        self._asset_names_lock = threading.Lock()
 
     def _parse_filename(self, content_disposition: str | None) -> str | None:
         if not content_disposition:
             return None
-        match = re.search(r'filename\\*=UTF-8\\\'\\\'([^;]+)', content_disposition)
+        match = _RE_FILENAME_EXT.search(content_disposition)
         if match:
             return match.group(1)
-        match = re.search(r'filename="?([^";]+)"?', content_disposition)
+        match = _RE_FILENAME_PLAIN.search(content_disposition)
         if match:
             return match.group(1)
         return None
 
+    @staticmethod
+    def _image_cache_paths(src: str) -> Tuple[Path, Path]:
+        key = hashlib.sha1(src.encode("utf-8")).hexdigest()
+        return _IMAGE_CACHE_DIR / f"{key}.body", _IMAGE_CACHE_DIR / f"{key}.meta"
+
+    def _load_cached_image_meta(self, src: str) -> dict | None:
+        """Return the on-disk cache metadata for `src`, or None."""
+        body_path, meta_path = self._image_cache_paths(src)
+        if not (body_path.is_file() and meta_path.is_file()):
+            return None
+        try:
+            return json.loads(meta_path.read_text(encoding="utf-8"))
+        except Exception:
+            return None
+
+    def _store_cached_image(
+        self,
+        src: str,
+        content: bytes,
+        mime: str | None,
+        filename: str | None,
+        *,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> None:
+        body_path, meta_path = self._image_cache_paths(src)
+        _write_cache_entry(
+            meta_path,
+            body_path,
+            {
+                "url": src,
+                "mime": mime,
+                "filename": filename,
+                "etag": etag,
+                "last_modified": last_modified,
+                "fetched_at": time.time(),
+            },
+            content,
+        )
+
+    def _remember_image(
+        self, src: str, entry: Tuple[bytes, str | None, str | None]
+    ) -> None:
+        """
+        Keep `entry` in the in-process cache, evicting oldest-first when
+        the byte budget is exceeded. Insertion order makes the plain
+        dict FIFO. The lock keeps insert and evict atomic: the prefetch
+        pools of concurrent lesson workers all land here, and unlocked
+        eviction can pop a key twice or iterate the dict mid-insert.
+        """
+        with self._image_cache_lock:
+            if src not in self._image_cache:
+                self._image_cache_bytes += len(entry[0])
+            self._image_cache[src] = entry
+            while self._image_cache_bytes > _IMAGE_CACHE_MAX_BYTES:
+                old_src = next(iter(self._image_cache))
+                if old_src == src:
+                    break
+                old_entry = self._image_cache.pop(old_src)
+                self._image_cache_bytes -= len(old_entry[0])
+
     def _download_image_bytes(self, src: str) -> Tuple[bytes, str | None, str | None] | None:
         if src in self._image_cache:
             return self._image_cache[src]
+
+        # Fresh disk entries are served directly; stale ones keep their
+        # validators so the refetch below can turn into a 304.
+        meta = self._load_cached_image_meta(src)
+        cond_headers: Dict[str, str] = {}
+        if meta is not None:
+            body_path, _ = self._image_cache_paths(src)
+            if time.time() - meta.get("fetched_at", 0.0) < _CACHE_TTL:
+                try:
+                    entry = (
+                        body_path.read_bytes(),
+                        meta.get("mime"),
+                        meta.get("filename"),
+                    )
+                    self._remember_image(src, entry)
+                    return entry
+                except OSError:
+                    meta = None
+            else:
+                if meta.get("etag"):
+                    cond_headers["If-None-Match"] = meta["etag"]
+                if meta.get("last_modified"):
+                    cond_headers["If-Modified-Since"] = meta["last_modified"]
+
         try:
-            resp = requests.get(src, timeout=10)
+            # stream=True reads the body straight off the socket without
+            # requests buffering/decoding it behind our back
+            resp = _SESSION.get(
+                src, timeout=10, stream=True, headers=cond_headers or None
+            )
+
+            if resp.status_code == 304 and meta is not None:
+                # Unchanged on the server: refresh the entry timestamp
+                # and serve the cached bytes with zero body transfer
+                resp.close()
+                body_path, _ = self._image_cache_paths(src)
+                content = body_path.read_bytes()
+                self._store_cached_image(
+                    src,
+                    content,
+                    meta.get("mime"),
+                    meta.get("filename"),
+                    etag=meta.get("etag"),
+                    last_modified=meta.get("last_modified"),
+                )
+                entry = (content, meta.get("mime"), meta.get("filename"))
+                self._remember_image(src, entry)
+                return entry
+
             resp.raise_for_status()
+            # Reject oversized images from the header alone, before any
+            # body bytes are read off the socket
+            declared = int(resp.headers.get("Content-Length") or 0)
+            if declared > _MAX_IMAGE_BYTES:
+                resp.close()
+                log.warning(
+                    "Skipping image %s: %d bytes exceeds the %d byte limit",
+                    src,
+                    declared,
+                    _MAX_IMAGE_BYTES,
+                )
+                return None
+            content = b"".join(resp.iter_content(64 * 1024))
             content_type = resp.headers.get("Content-Type")
             filename = self._parse_filename(resp.headers.get("Content-Disposition"))
-            self._image_cache[src] = (resp.content, content_type, filename)
-            return resp.content, content_type, filename
+            self._remember_image(src, (content, content_type, filename))
+            self._store_cached_image(
+                src,
+                content,
+                content_type,
+                filename,
+                etag=resp.headers.get("ETag"),
+                last_modified=resp.headers.get("Last-Modified"),
+            )
+            return content, content_type, filename
         except Exception as e:
-            print(f"Image download failed for {src}: {e}")
+            log.warning("Image download failed for %s: %s", src, e)
             return None
 
+    def prefetch_images(self, srcs: List[str]) -> None:
+        """
+        Warm the image cache by downloading the given URLs concurrently.
+        Duplicates and already-cached URLs are skipped, so repeated
+        assets (logos, shared diagrams) are fetched and encoded once.
+        """
+        pending = [
+            s for s in dict.fromkeys(srcs) if s and s not in self._image_cache
+        ]
+        if not pending:
+            return
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(self._download_image_bytes, pending))
+
     def make_image_resolver(
         self,
         mode: str,
@@ -152,11 +537,16 @@ class EdClient:
         mode = (mode or "base64").lower()
         cache: Dict[str, str] = {}
         counters: Dict[str, int] = {"img": 0, "pdf": 0, "asset": 0}
-        used_names: set[str] = set()
+        # Directories this resolver has already created; saves a stat
+        # syscall per image once the assets dir exists
+        created_dirs: set[Path] = set()
 
         def _infer_ext(src: str, content: bytes | None, header_mime: str | None) -> str:
-            # 1) try response header mime
+            # 1) try response header mime (known types skip mimetypes)
             if header_mime:
+                known = _MIME2EXT.get(header_mime)
+                if known:
+                    return known
                 guessed = mimetypes.guess_extension(header_mime)
                 if guessed:
                     return guessed
@@ -164,23 +554,26 @@ class EdClient:
                     return ".jpg"
 
             # 2) try mimetype from URL
-            url_mime = mimetypes.guess_type(src)[0]
+            url_mime = _guess_mime(src)
             if url_mime:
-                guessed = mimetypes.guess_extension(url_mime)
+                guessed = _MIME2EXT.get(url_mime) or mimetypes.guess_extension(url_mime)
                 if guessed:
                     return guessed
 
             # 3) inspect bytes with filetype
             if content:
-                kind = filetype.guess(content)
+                kind = _guess_filetype(bytes(content[:262]))
                 if kind and kind.extension:
                     return f".{kind.extension}"
 
-            # 4) fall back to URL suffix if present
-            parsed = urlparse(src)
-            suffix = os.path.splitext(parsed.path)[1].lower()
-            if suffix and suffix not in {".bin", ".dat"}:
-                return suffix
+            # 4) fall back to URL suffix if present; one regex search on
+            # the stripped path instead of urlparse + splitext
+            path_only = src.partition("?")[0].partition("#")[0]
+            m = _RE_URL_EXT.search(path_only)
+            if m:
+                suffix = "." + m.group(1).lower()
+                if suffix not in {".bin", ".dat"}:
+                    return suffix
 
             # 5) safest default for images
             return ".jpg"
@@ -197,23 +590,27 @@ class EdClient:
                 result = src
 
             elif mode == "base64":
-                download = self._download_image_bytes(src)
-                if download is not None:
-                    content, header_mime, header_filename = download
-                    mime = header_mime or mimetypes.guess_type(src)[0]
-                    if not mime:
-                        kind = filetype.guess(content)
-                        mime = kind.mime if kind and kind.mime else "application/octet-stream"
-                    b64 = base64.b64encode(content).decode("ascii")
-                    result = f"data:{mime};base64,{b64}"
+                cached_uri = self._data_uri_cache.get(src)
+                if cached_uri is not None:
+                    result = cached_uri
+                else:
+                    download = self._download_image_bytes(src)
+                    if download is not None:
+                        content, header_mime, header_filename = download
+                        mime = header_mime or _guess_mime(src)
+                        if not mime:
+                            kind = _guess_filetype(bytes(content[:262]))
+                            mime = kind.mime if kind and kind.mime else "application/octet-stream"
+                        result = _data_uri(mime, content)
+                        self._data_uri_cache[src] = result
 
             elif mode == "file" and assets_dir:
                 download = self._download_image_bytes(src)
                 if download is not None:
                     content, header_mime, header_filename = download
-                    mime = header_mime or mimetypes.guess_type(src)[0]
+                    mime = header_mime or _guess_mime(src)
                     if not mime:
-                        kind = filetype.guess(content)
+                        kind = _guess_filetype(bytes(content[:262]))
                         mime = kind.mime if kind and kind.mime else None
                     ext = _infer_ext(src, content, header_mime)
                     prefix = "pdf" if (ext.lower() == ".pdf" or (mime and mime.startswith("application/pdf"))) else "img"
@@ -232,35 +629,42 @@ class EdClient:
                         if basename:
                             raw_name = unquote(basename)
 
-                    filename = ""
-                    if raw_name:
-                        raw_name = safe_filename(raw_name)
-                        if raw_name.lower() in {"blob", "blob.bin", "file", "file.bin", "unknown"}:
-                            raw_name = ""
-                        base_no_ext, existing_ext = os.path.splitext(raw_name)
-                        if not base_no_ext.strip():
-                            raw_name = ""
-                        else:
-                            if not raw_name.lower().endswith(ext.lower()):
-                                raw_name = f"{raw_name}{ext}"
-                            base, suffix_ext = os.path.splitext(raw_name)
-                            candidate = raw_name
-                            dedup = 1
-                            while candidate in used_names or (assets_dir and (assets_dir / candidate).exists()):
-                                dedup += 1
-                                candidate = f"{base}_{dedup:03d}{suffix_ext or ext}"
-                            filename = candidate
-                    if not filename:
-                        counters[prefix] = counters.get(prefix, 0) + 1
-                        candidate = f"{prefix}{counters[prefix]:03d}{ext}"
-                        while candidate in used_names or (assets_dir and (assets_dir / candidate).exists()):
-                            counters[prefix] += 1
+                    # Name selection runs under one client-wide lock:
+                    # resolvers for different lessons share a module's
+                    # assets dir, and the claim must be atomic across
+                    # them to keep two downloads out of one filename.
+                    with self._asset_names_lock:
+                        used_names = self._asset_names.setdefault(assets_dir, set())
+                        filename = ""
+                        if raw_name:
+                            raw_name = safe_filename(raw_name)
+                            if raw_name.lower() in {"blob", "blob.bin", "file", "file.bin", "unknown"}:
+                                raw_name = ""
+                            base_no_ext, existing_ext = os.path.splitext(raw_name)
+                            if not base_no_ext.strip():
+                                raw_name = ""
+                            else:
+                                if not raw_name.lower().endswith(ext.lower()):
+                                    raw_name = f"{raw_name}{ext}"
+                                base, suffix_ext = os.path.splitext(raw_name)
+                                candidate = raw_name
+                                dedup = 1
+                                while candidate in used_names or (assets_dir / candidate).exists():
+                                    dedup += 1
+                                    candidate = f"{base}_{dedup:03d}{suffix_ext or ext}"
+                                filename = candidate
+                        if not filename:
+                            counters[prefix] = counters.get(prefix, 0) + 1
                             candidate = f"{prefix}{counters[prefix]:03d}{ext}"
-                        filename = candidate
-                    used_names.add(filename)
+                            while candidate in used_names or (assets_dir / candidate).exists():
+                                counters[prefix] += 1
+                                candidate = f"{prefix}{counters[prefix]:03d}{ext}"
+                            filename = candidate
+                        used_names.add(filename)
                     target = assets_dir / filename
-                    if not target.parent.exists():
+                    if target.parent not in created_dirs:
                         target.parent.mkdir(parents=True, exist_ok=True)
+                        created_dirs.add(target.parent)
                     target.write_bytes(content)
                     rel_base = markdown_dir if markdown_dir else assets_dir
                     rel_path = os.path.relpath(target, rel_base)
@@ -270,15 +674,34 @@ class EdClient:
             cache[src] = result
             return result
 
+        # expose the mode so callers can decide whether prefetching pays off
+        resolve.mode = mode
         return resolve
 
+    def _get_json(self, url: str) -> Any:
+        """GET a JSON endpoint through the on-disk response cache."""
+        return _loads(cached_get(url, headers=self._headers))
+
     def get_courses(self) -> List[dict]:
-        r = request("GET", self.base_url + "/user", headers=self._headers)
-        u = r.json()
+        u = self._get_json(self.base_url + "/user")
         return sorted(u["courses"], key=lambda x: x["course"]["code"])
 
-    def select_course_interactive(self) -> dict:
+    def select_course_interactive(self, preselect: str | None = None) -> dict:
         courses = self.get_courses()
+
+        # Non-interactive path: pick by exact course code so the whole
+        # pipeline can run headlessly (scripting, profiling).
+        if preselect:
+            for c in courses:
+                if c["course"]["code"] == preselect:
+                    log.info(
+                        "Preselected course: %s %s",
+                        c["course"]["code"],
+                        c["course"]["name"],
+                    )
+                    return c
+            log.warning("No course with code %r, falling back to prompt.", preselect)
+
         no_list: List[str] = []
 
         print("\n=== Your courses on Ed ===")
@@ -305,14 +728,13 @@ class EdClient:
         """
 
         lessons_url = f"{self.base_url}/courses/{course_id}/lessons"
-        r = request("GET", lessons_url, headers=self._headers)
-        data = r.json()
+        data = self._get_json(lessons_url)
 
         lessons = data.get("lessons", [])
         modules_list = data.get("modules", [])
 
         if not lessons:
-            print("This course currently has no lessons (API returned an empty list).")
+            log.info("This course currently has no lessons (API returned an empty list).")
             return [], {}
 
         lessons_sorted = sorted(
@@ -320,63 +742,68 @@ class EdClient:
             key=lambda l: (l.get("id") is None, l.get("id") or 0),
         )
 
-        print("=== Lessons in this course (sorted by lesson_id) ===")
+        # One pass over the lessons covers both the listing and the
+        # per-type tally; the listing is emitted as a single log record
+        # instead of one flushed write per lesson
+        type_counter: Counter = Counter()
+
+        lines = ["=== Lessons in this course (sorted by lesson_id) ==="]
         for idx, lesson in enumerate(lessons_sorted, start=1):
             lesson_id = lesson.get("id")
             title = lesson.get("title")
             ltype = lesson.get("type")
             module_id = lesson.get("module_id")
+            type_counter[ltype or "unknown"] += 1
 
-            print(
+            lines.append(
                 f"{idx:2d}. "
                 f"[id={lesson_id}] "
                 f"type={ltype:<8} "
                 f"module={module_id:<6} "
                 f"- {title}"
             )
-        print()
-
-        type_counter: Dict[str, int] = {}
-        for lesson in lessons_sorted:
-            t = lesson.get("type") or "unknown"
-            type_counter[t] = type_counter.get(t, 0) + 1
 
-        print("Lesson type summary:")
+        lines.append("")
+        lines.append("Lesson type summary:")
         for t, count in sorted(type_counter.items(), key=lambda x: x[0]):
-            print(f"  {t}: {count}")
-        print()
+            lines.append(f"  {t}: {count}")
 
-        module_name_map: Dict[int, str] = {}
-        for m in modules_list:
-            mid = m.get("id")
-            if isinstance(mid, int):
-                mname = m.get("name") or m.get("title") or f"module_{mid}"
-                module_name_map[mid] = mname
+        if log.isEnabledFor(logging.INFO):
+            log.info("%s", "\n".join(lines))
+
+        module_name_map: Dict[int, str] = {
+            m["id"]: m.get("name") or m.get("title") or f"module_{m['id']}"
+            for m in modules_list
+            if isinstance(m.get("id"), int)
+        }
 
         return lessons_sorted, module_name_map
 
     def fetch_lesson_detail(self, lesson_id: int) -> dict:
         lesson_url = f"{self.base_url}/lessons/{lesson_id}?view=1"
-        r = request("GET", lesson_url, headers=self._headers)
-        data = r.json()
+        data = self._get_json(lesson_url)
         return data.get("lesson", data)
 
     def fetch_slide_detail(self, slide_id: int) -> dict:
         slide_url = f"{self.base_url}/lessons/slides/{slide_id}?view=1"
-        rs = request("GET", slide_url, headers=self._headers)
-        slide_json = rs.json()
+        slide_json = self._get_json(slide_url)
         return slide_json.get("slide", slide_json)
 
     def fetch_quiz_data(self, slide_id: int) -> Tuple[Any, Any, Any]:
         q_base = f"{self.base_url}/lessons/slides/{slide_id}/questions"
 
-        rq = request("GET", q_base, headers=self._headers)
-        rr = request("GET", q_base + "/responses", headers=self._headers)
-        rs2 = request("GET", q_base + "/states", headers=self._headers)
+        # The three quiz endpoints are independent, fetch them concurrently
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            fq = pool.submit(self._get_json, q_base)
+            fr = pool.submit(self._get_json, q_base + "/responses")
+            fs = pool.submit(self._get_json, q_base + "/states")
+            questions_json, responses_json, states_json = (
+                fq.result(), fr.result(), fs.result()
+            )
 
-        questions = rq.json().get("questions", rq.json())
-        responses = rr.json().get("responses", rr.json())
-        states = rs2.json().get("states", rs2.json())
+        questions = questions_json.get("questions", questions_json)
+        responses = responses_json.get("responses", responses_json)
+        states = states_json.get("states", states_json)
 
         return questions, responses, states
 
@@ -385,6 +812,5 @@ class EdClient:
         Fetch the full challenge payload for code slides.
         """
         url = f"{self.base_url}/challenges/{challenge_id}?view=1"
-        r = request("GET", url, headers=self._headers)
-        data = r.json()
+        data = self._get_json(url)
         return data.get("challenge", data)
@@ -1,103 +1,171 @@
+import logging
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List
+from xml.sax.saxutils import unescape
 
 from ed_client import EdClient, safe_filename
-from converters import edxml_to_markdown
+from converters import edxml_batch_to_markdown
+
+log = logging.getLogger("edstem")
+
+# Slide fetches are I/O-bound on the Ed API, so a modest thread pool
+# overlaps them instead of paying one round trip per slide.
+SLIDE_WORKERS = 8
+
+# Image srcs are prescanned from the raw EdXML so downloads can be
+# warmed concurrently before the (sequential) markdown conversion.
+# Matches are still XML-escaped (query strings serialize & as &amp;)
+# and must be unescaped before use, or the prefetch hits the wrong URL.
+_RE_IMAGE_SRC = re.compile(r'<image[^>]*?src="([^"]+)"', re.IGNORECASE)
+
+_XML_ATTR_ENTITIES = {"&quot;": '"', "&apos;": "'"}
+
+# Directories already created this run; modules hold many lessons, so
+# this skips a redundant stat+mkdir per lesson. A benign race between
+# lesson workers just means one extra exist_ok mkdir.
+_created_dirs: set = set()
+
+
+def _ensure_dir(path: Path) -> None:
+    if path not in _created_dirs:
+        path.mkdir(parents=True, exist_ok=True)
+        _created_dirs.add(path)
+
+
+def _process_slide(client: EdClient, slide: dict) -> dict | None:
+    """
+    Fetch a single slide, returns structured dict (or None for slides
+    without an id). EdXML -> Markdown conversion is deferred so that a
+    whole lesson can be converted in one pandoc invocation.
+    """
+    slide_id = slide.get("id")
+    if slide_id is None:
+        return None
+
+    slide_data = client.fetch_slide_detail(slide_id)
+    stype = slide_data.get("type")
+
+    base_info = {
+        "id": slide_id,
+        "type": stype,
+        "title": slide_data.get("title"),
+        "index": slide_data.get("index"),
+    }
+
+    if stype == "document":
+        content_xml = slide_data.get("content") or ""
+        return {
+            **base_info,
+            "content_xml": content_xml,
+            "content_md": "",
+        }
+
+    if stype == "quiz":
+        questions, responses, states = client.fetch_quiz_data(slide_id)
+        return {
+            **base_info,
+            "passage": slide_data.get("passage"),
+            "questions": questions,
+            "responses": responses,
+            "states": states,
+        }
+
+    if stype == "pdf":
+        return {
+            **base_info,
+            "file_url": slide_data.get("file_url"),
+        }
+
+    if stype == "code":
+        content_xml = slide_data.get("content") or ""
+        explanation_xml = ""
+        challenge_id = slide_data.get("challenge_id")
+        if isinstance(challenge_id, int):
+            try:
+                challenge = client.fetch_challenge_detail(challenge_id)
+                explanation_xml = challenge.get("explanation") or ""
+            except Exception as e:
+                log.warning("Failed to fetch challenge %s: %s", challenge_id, e)
+
+        return {
+            **base_info,
+            "content_xml": content_xml,
+            "content_md": "",
+            "explanation_xml": explanation_xml,
+            "explanation_md": "",
+        }
+
+    return base_info
+
+
+def _convert_lesson_slides(processed_slides: List[dict], image_resolver=None) -> None:
+    """
+    Convert all EdXML fragments of a lesson with one batched pandoc
+    invocation, writing the markdown back into the slide dicts.
+    """
+    targets: List[tuple] = []  # (slide, markdown key)
+    xmls: List[str] = []
+
+    for slide in processed_slides:
+        stype = slide.get("type")
+        if stype in ("document", "code"):
+            targets.append((slide, "content_md"))
+            xmls.append(slide.get("content_xml") or "")
+        if stype == "code" and slide.get("explanation_xml"):
+            targets.append((slide, "explanation_md"))
+            xmls.append(slide["explanation_xml"])
+
+    if not xmls:
+        return
+
+    mds = edxml_batch_to_markdown(xmls, image_resolver=image_resolver)
+    for (slide, key), md in zip(targets, mds):
+        slide[key] = md
+
+    # The raw XML is dead weight once converted; dropping it halves the
+    # per-lesson memory held until the markdown is written out.
+    for slide in processed_slides:
+        slide.pop("content_xml", None)
+        slide.pop("explanation_xml", None)
 
 
 def fetch_lesson_content(client: EdClient, lesson: dict, image_resolver=None) -> dict:
     """
     Get slides of a lesson, returns structured dict.
+    Slides are fetched concurrently but returned in lesson order.
     """
     lesson_id = lesson["id"]
     lesson_title = lesson.get("title")
     lesson_type = lesson.get("type")
 
-    print(f"Fetching lesson {lesson_id} - {lesson_title!r} (type={lesson_type}) ...")
+    log.info(
+        "Fetching lesson %s - %r (type=%s) ...", lesson_id, lesson_title, lesson_type
+    )
 
     lesson_detail = client.fetch_lesson_detail(lesson_id)
     slides = lesson_detail.get("slides") or []
 
-    processed_slides: List[dict] = []
-
-    for s in slides:
-        slide_id = s.get("id")
-        if slide_id is None:
-            continue
-
-        slide_data = client.fetch_slide_detail(slide_id)
-        stype = slide_data.get("type")
-
-        base_info = {
-            "id": slide_id,
-            "type": stype,
-            "title": slide_data.get("title"),
-            "index": slide_data.get("index"),
-        }
-
-        if stype == "document":
-            content_xml = slide_data.get("content") or ""
-            content_md = edxml_to_markdown(
-                content_xml,
-                image_resolver=image_resolver,
-            )
-            processed_slides.append(
-                {
-                    **base_info,
-                    "content_xml": content_xml,
-                    "content_md": content_md,
-                }
-            )
-
-        elif stype == "quiz":
-            questions, responses, states = client.fetch_quiz_data(slide_id)
-            processed_slides.append(
-                {
-                    **base_info,
-                    "passage": slide_data.get("passage"),
-                    "questions": questions,
-                    "responses": responses,
-                    "states": states,
-                }
-            )
-        elif stype == "pdf":
-            processed_slides.append(
-                {
-                    **base_info,
-                    "file_url": slide_data.get("file_url"),
-                }
-            )
-        elif stype == "code":
-            content_xml = slide_data.get("content") or ""
-            content_md = edxml_to_markdown(
-                content_xml,
-                image_resolver=image_resolver,
-            )
-            explanation_md = ""
-            challenge_id = slide_data.get("challenge_id")
-            if isinstance(challenge_id, int):
-                try:
-                    challenge = client.fetch_challenge_detail(challenge_id)
-                    explanation_xml = challenge.get("explanation") or ""
-                    if explanation_xml:
-                        explanation_md = edxml_to_markdown(
-                            explanation_xml,
-                            image_resolver=image_resolver,
-                        )
-                except Exception as e:
-                    print(f"Failed to fetch challenge {challenge_id}: {e}")
-
-            processed_slides.append(
-                {
-                    **base_info,
-                    "content_xml": content_xml,
-                    "content_md": content_md,
-                    "explanation_md": explanation_md,
-                }
-            )
-        else:
-            processed_slides.append(base_info)
+    with ThreadPoolExecutor(max_workers=SLIDE_WORKERS) as pool:
+        futures = [pool.submit(_process_slide, client, s) for s in slides]
+        processed_slides: List[dict] = [
+            result for f in futures if (result := f.result()) is not None
+        ]
+
+    # Warm the image cache concurrently before conversion; pointless in
+    # "url" mode where images are never downloaded.
+    if getattr(image_resolver, "mode", None) in ("base64", "file"):
+        srcs = [
+            unescape(src, _XML_ATTR_ENTITIES)
+            for slide in processed_slides
+            for src in _RE_IMAGE_SRC.findall(slide.get("content_xml") or "")
+        ]
+        if srcs:
+            client.prefetch_images(srcs)
+
+    _convert_lesson_slides(processed_slides, image_resolver=image_resolver)
 
     result = {
         "lesson_meta": {
@@ -108,7 +176,7 @@ def fetch_lesson_content(client: EdClient, lesson: dict, image_resolver=None) ->
         "slides": processed_slides,
     }
 
-    print(f"  -> fetched {len(processed_slides)} slides.")
+    log.info("  -> fetched %d slides.", len(processed_slides))
     return result
 
 
@@ -131,45 +199,50 @@ def save_lesson_markdown(
     lesson_title = lesson.get("title") or f"lesson_{lesson['id']}"
 
     module_dir = Path(course_root) / safe_filename(module_name)
-    module_dir.mkdir(parents=True, exist_ok=True)
+    _ensure_dir(module_dir)
 
     file_path = module_dir / f"{safe_filename(lesson_title)}.md"
 
-    parts: List[str] = []
-
-    for slide in lesson_struct.get("slides", []):
+    def _slide_parts(slide: dict):
+        """Yield the markdown chunks of one slide."""
         stitle = slide.get("title") or f"Slide {slide.get('index')}"
         stype = slide.get("type")
 
-        parts.append(f"# {stitle}")
+        yield f"# {stitle}"
 
         if stype == "document":
             body = slide.get("content_md") or ""
             if body:
-                parts.append(body)
+                yield body
         elif stype == "quiz":
-            parts.append("_Quiz slide: questions/responses not converted to markdown yet._")
+            yield "_Quiz slide: questions/responses not converted to markdown yet._"
         elif stype == "pdf":
             file_url = slide.get("file_url") or "(missing pdf url)"
             if assets_resolver:
                 file_url = assets_resolver(file_url)
             label = Path(file_url).name if file_url else "PDF"
-            parts.append(f"[{label}]({file_url})")
+            yield f"[{label}]({file_url})"
         elif stype == "code":
             body = slide.get("content_md") or ""
             if body:
-                parts.append(body)
+                yield body
             explanation_md = slide.get("explanation_md") or ""
             if explanation_md:
-                solution_title = f"# {stitle} - Solution"
-                parts.append(solution_title)
-                parts.append(explanation_md)
+                yield f"# {stitle} - Solution"
+                yield explanation_md
         else:
-            parts.append(f"_Slide of type `{stype}` not converted (code/pdf/etc)._")
-
-    md_text = "\n\n".join(parts) + "\n"
-
-    with open(file_path, "w", encoding="utf-8") as f:
-        f.write(md_text)
-
-    print(f"  -> saved markdown to {file_path}")
+            yield f"_Slide of type `{stype}` not converted (code/pdf/etc)._"
+
+    # Stream each chunk to disk instead of materializing the whole
+    # lesson as one string; the large buffer keeps writes coalesced.
+    with open(file_path, "w", encoding="utf-8", buffering=1 << 20) as f:
+        first = True
+        for slide in lesson_struct.get("slides", []):
+            for part in _slide_parts(slide):
+                if not first:
+                    f.write("\n\n")
+                f.write(part)
+                first = False
+        f.write("\n")
+
+    log.info("  -> saved markdown to %s", file_path)
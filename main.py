@@ -1,17 +1,71 @@
+import logging
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from config import load_config, get_ed_host, get_token, get_image_mode, get_output_dir
 from ed_client import EdClient, safe_filename
 from exporter import fetch_lesson_content, save_lesson_markdown
 
+# A few lessons in flight keeps the network busy while another lesson
+# is in its pandoc conversion; kept small to stay under Ed's rate limit.
+LESSON_WORKERS = 3
+
+log = logging.getLogger("edstem")
+
+
+def _process_one_lesson(
+    client: EdClient,
+    course_root: Path,
+    module_name_map: dict,
+    lesson: dict,
+    image_mode: str,
+    idx: int,
+    total: int,
+) -> None:
+    log.info(
+        "\n=== [%d/%d] Processing lesson id=%s - %r ===",
+        idx,
+        total,
+        lesson["id"],
+        lesson.get("title"),
+    )
+    module_id = lesson.get("module_id")
+    if isinstance(module_id, int):
+        module_name = module_name_map.get(module_id, f"module_{module_id}")
+    else:
+        module_name = "module_unknown"
+
+    module_dir = course_root / safe_filename(module_name)
+    assets_dir = module_dir / "assets"
+    resolver = client.make_image_resolver(
+        image_mode,
+        assets_dir=assets_dir,
+        markdown_dir=module_dir,
+    )
+
+    lesson_struct = fetch_lesson_content(
+        client,
+        lesson,
+        image_resolver=resolver,
+    )
+    save_lesson_markdown(
+        course_root,
+        module_name_map,
+        lesson,
+        lesson_struct,
+        assets_resolver=resolver,
+    )
+
 
 def export_course_lessons_to_markdown(
     client: EdClient,
     course_root: Path,
     image_mode: str,
+    course_code: str | None = None,
 ) -> None:
-    selected_course = client.select_course_interactive()
+    selected_course = client.select_course_interactive(preselect=course_code)
     course_info = selected_course["course"]
     course_id = course_info["id"]
     course_code = course_info["code"]
@@ -26,40 +80,32 @@ def export_course_lessons_to_markdown(
         return
 
     total = len(lessons_sorted)
-    for idx, lesson in enumerate(lessons_sorted, start=1):
-        print(
-            f"\n=== [{idx}/{total}] Processing lesson id={lesson['id']} "
-            f"- {lesson.get('title')!r} ==="
-        )
-        module_id = lesson.get("module_id")
-        if isinstance(module_id, int):
-            module_name = module_name_map.get(module_id, f"module_{module_id}")
-        else:
-            module_name = "module_unknown"
-
-        module_dir = course_root / safe_filename(module_name)
-        assets_dir = module_dir / "assets"
-        resolver = client.make_image_resolver(
-            image_mode,
-            assets_dir=assets_dir,
-            markdown_dir=module_dir,
-        )
-
-        lesson_struct = fetch_lesson_content(
-            client,
-            lesson,
-            image_resolver=resolver,
-        )
-        save_lesson_markdown(
-            course_root,
-            module_name_map,
-            lesson,
-            lesson_struct,
-            assets_resolver=resolver,
-        )
+    with ThreadPoolExecutor(max_workers=LESSON_WORKERS) as pool:
+        futures = [
+            pool.submit(
+                _process_one_lesson,
+                client,
+                course_root,
+                module_name_map,
+                lesson,
+                image_mode,
+                idx,
+                total,
+            )
+            for idx, lesson in enumerate(lessons_sorted, start=1)
+        ]
+        for f in futures:
+            f.result()
 
 
 def main() -> None:
+    # Progress/diagnostic output goes through one stderr StreamHandler,
+    # which keeps stdout free for the interactive course prompt
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(message)s",
+        stream=sys.stderr,
+    )
     cfg = load_config()  # read ./config.toml
     base_url = get_ed_host(cfg)
     token = get_token(cfg)
@@ -69,7 +115,10 @@ def main() -> None:
     output_dir.mkdir(parents=True, exist_ok=True)
 
     client = EdClient(token=token, base_url=base_url)
-    export_course_lessons_to_markdown(client, output_dir, image_mode)
+    # Optional headless selection: skip the prompt when the course
+    # code is supplied via environment variable
+    course_code = os.environ.get("ED_COURSE_CODE") or None
+    export_course_lessons_to_markdown(client, output_dir, image_mode, course_code)
 
 
 if __name__ == "__main__":